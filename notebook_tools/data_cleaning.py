@@ -1,7 +1,14 @@
 """Functions used in generating clean data structures from raw data."""
-from calendar import month_name
+import json
+import re
+from functools import lru_cache
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+from pandas.api.types import is_bool_dtype, is_integer_dtype
 
 from notebook_tools import DATA_DIR
 
@@ -9,6 +16,20 @@ ACC_LOANS_PATH = DATA_DIR / "accepted_2007_to_2018Q4.csv"
 REJ_LOANS_PATH = DATA_DIR / "rejected_2007_to_2018Q4.csv"
 ACC_LOANS_METADATA_PATH = DATA_DIR / "accepted_loans_metadata.csv"
 
+# Parquet files used to cache the parsed contents of the raw CSV files
+ACC_LOANS_PARQUET_PATH = DATA_DIR / "accepted_2007_to_2018Q4.parquet"
+REJ_LOANS_PARQUET_PATH = DATA_DIR / "rejected_2007_to_2018Q4.parquet"
+
+# Number of bytes of a raw CSV file to parse at a time in converting it to Parquet
+CSV_BLOCK_SIZE = 64 * 2**20
+
+# Version of the procedure used to build the Parquet caches.  Increment it whenever
+# that procedure changes, so that existing caches are rebuilt.
+PARQUET_CACHE_VERSION = 3
+
+# Key in the Parquet schema metadata under which the cache signature is stored
+PARQUET_CACHE_SIGNATURE_KEY = b"notebook_tools.cache_signature"
+
 # Names of columns to exclude in loading the data
 ACC_LOANS_EXCLUDED_COLUMNS = (
     "member_id",
@@ -21,6 +42,20 @@ ACC_LOANS_EXCLUDED_COLUMNS = (
     "deferral_term",
 )
 
+# Names of low-cardinality string columns to load as categoricals
+ACC_LOANS_CATEGORICAL_COLUMNS = (
+    "grade",
+    "sub_grade",
+    "home_ownership",
+    "verification_status",
+    "loan_status",
+    "purpose",
+    "addr_state",
+    "initial_list_status",
+    "application_type",
+    "disbursement_method",
+)
+
 # Identifiers for data-conversion steps
 ACC_LOANS_CONVERSIONS = ("time_intervals", "dates", "booleans")
 REJ_LOANS_CONVERSIONS = ("percentages",)
@@ -41,6 +76,9 @@ ACC_LOANS_DATE_COLUMNS = (
 )
 ACC_LOANS_BOOLEAN_COLUMNS = ("pymnt_plan", "hardship_flag", "debt_settlement_flag")
 
+# Pattern matched by dates that have been converted to ISO format, e.g., 2015-06
+ISO_DATE_PATTERN = re.compile(r"\d{4}-\d{2}")
+
 # The data types to use in loading the table of rejected loans.
 REJ_LOANS_DTYPES = {
     "Amount Requested": "Float64",
@@ -66,13 +104,27 @@ def load_acc_loan_data(excluded_cols=ACC_LOANS_EXCLUDED_COLUMNS):
     """
     metadata = load_acc_loan_metadata()
     dtypes = metadata["data type"].to_dict()
-
-    return pd.read_csv(
-        ACC_LOANS_PATH,
-        dtype=dtypes,
-        usecols=lambda col_name: col_name not in excluded_cols,
+    # Columns with only a handful of distinct values are much more compact (and faster
+    # to compare and group) as categoricals than as strings.
+    dtypes.update(
+        {
+            col_name: "category"
+            for col_name in ACC_LOANS_CATEGORICAL_COLUMNS
+            if col_name in dtypes
+        }
     )
 
+    # Only the columns that are described in the metadata (e.g., the empty column
+    # 'member_id' is not) and not excluded are parsed.  Passing an explicit list of
+    # columns rather than a callable lets the parser skip the other columns without
+    # tokenizing them.
+    dtypes = {
+        col_name: dtype
+        for col_name, dtype in dtypes.items()
+        if col_name not in excluded_cols
+    }
+    return _read_csv_with_cache(ACC_LOANS_PATH, ACC_LOANS_PARQUET_PATH, dtypes)
+
 
 def load_acc_loan_feat_desc():
     """Load a table of feature descriptions for data on accepted loans.
@@ -93,7 +145,10 @@ def load_acc_loan_metadata(cleaned_data=None):
         - Features that have been removed from the cleaned data are also removed from
             the table of metadata.
         - Data types in the table of metadata are updated to match those in the cleaned
-            data.
+            data, except that the columns in ACC_LOANS_CATEGORICAL_COLUMNS keep the
+            data type 'string'.  The categorical data type is only used to speed up the
+            data cleaning; the table of metadata is stored in the database, which
+            returns these columns as strings.
 
     Args:
         cleaned_data:  Dataframe of cleaned data on accepted loans.
@@ -102,15 +157,31 @@ def load_acc_loan_metadata(cleaned_data=None):
         Dataframe with index 'column name' and columns 'data type', 'category',
         'known at loan origination', and 'description'.
     """
-    metadata = pd.read_csv(ACC_LOANS_METADATA_PATH).set_index("column name")
+    # Return a copy so that callers cannot modify the cached table.
+    metadata = _read_acc_loan_metadata().copy()
     if cleaned_data is not None:
         metadata = metadata[metadata.index.isin(cleaned_data.columns)]
         metadata.loc[:, "data type"] = cleaned_data.dtypes.astype(str).reindex_like(
             metadata
         )
+        is_categorical = metadata.index.isin(ACC_LOANS_CATEGORICAL_COLUMNS)
+        metadata.loc[is_categorical, "data type"] = "string"
     return metadata
 
 
+@lru_cache(maxsize=1)
+def _read_acc_loan_metadata():
+    """Read the file of metadata on accepted loans.
+
+    The file is small and does not change, but it is read by several functions in this
+    module, so the result is cached.
+
+    Returns:
+        Dataframe with index 'column name'
+    """
+    return pd.read_csv(ACC_LOANS_METADATA_PATH).set_index("column name")
+
+
 def load_rej_loan_data():
     """Load the table of rejected loans from a file of raw data.
 
@@ -120,7 +191,171 @@ def load_rej_loan_data():
     Returns:
         Dataframe containing the table of rejected loans
     """
-    return pd.read_csv(REJ_LOANS_PATH, dtype=REJ_LOANS_DTYPES)
+    return _read_csv_with_cache(
+        REJ_LOANS_PATH, REJ_LOANS_PARQUET_PATH, REJ_LOANS_DTYPES
+    )
+
+
+def _read_csv_with_cache(csv_path, cache_path, dtypes):
+    """Read a file of raw data, using a Parquet file as a cache.
+
+    Parsing the large CSV files of raw data is slow, so the first call converts the CSV
+    file to a Parquet file, and every call reads the data from that file.  Only the
+    requested columns are parsed, and a cache holding more columns than requested can
+    be reused.  The cache is rebuilt if the CSV file is newer than the Parquet file, or
+    if the signature stored in the Parquet file (the cache version and the data type of
+    each cached column) does not cover the current request.
+
+    Args:
+        csv_path:  Path of the CSV file of raw data
+        cache_path:  Path of the Parquet file used as a cache
+        dtypes:  Dictionary whose keys are the names of the columns to load and whose
+            values are the data types to use for those columns
+
+    Returns:
+        Dataframe containing the raw data
+    """
+    if not _cache_is_current(csv_path, cache_path, dtypes):
+        _write_csv_to_parquet(csv_path, cache_path, dtypes)
+
+    # The pandas metadata stored in the Parquet file restores the requested data types.
+    data = pd.read_parquet(cache_path, columns=list(dtypes), memory_map=True)
+    # Categories read from the Parquet file are in the order in which they were first
+    # encountered.  Sort them, as pandas.read_csv and astype("category") do.
+    for col_name in data.select_dtypes("category").columns:
+        categories = sorted(data[col_name].cat.categories)
+        data[col_name] = data[col_name].cat.reorder_categories(categories)
+    return data
+
+
+def _get_cache_signature(dtypes):
+    """Generate the signature identifying how a Parquet cache is built.
+
+    Args:
+        dtypes:  Dictionary of data types of the columns parsed from the CSV file
+
+    Returns:
+        Dictionary containing the cache version and the data type of each column
+    """
+    return {
+        "version": PARQUET_CACHE_VERSION,
+        "dtypes": {col_name: str(dtype) for col_name, dtype in dtypes.items()},
+    }
+
+
+def _cache_is_current(csv_path, cache_path, dtypes):
+    """Check whether a Parquet cache can be used in place of a CSV file.
+
+    Args:
+        csv_path:  Path of the CSV file of raw data
+        cache_path:  Path of the Parquet file used as a cache
+        dtypes:  Dictionary of data types of the columns to load
+
+    Returns:
+        Boolean indicating whether the cache exists, is at least as recent as the CSV
+        file, was built with the current cache version, and contains each requested
+        column with the requested data type
+    """
+    if not cache_path.exists():
+        return False
+    if csv_path.exists() and cache_path.stat().st_mtime < csv_path.stat().st_mtime:
+        return False
+    schema_metadata = pq.read_schema(cache_path).metadata or {}
+    if PARQUET_CACHE_SIGNATURE_KEY not in schema_metadata:
+        return False
+    cached = json.loads(schema_metadata[PARQUET_CACHE_SIGNATURE_KEY])
+    requested = _get_cache_signature(dtypes)
+    return cached["version"] == requested["version"] and all(
+        cached["dtypes"].get(col_name) == dtype
+        for col_name, dtype in requested["dtypes"].items()
+    )
+
+
+def _write_csv_to_parquet(csv_path, parquet_path, dtypes, block_size=CSV_BLOCK_SIZE):
+    """Convert a CSV file to a Parquet file one block of rows at a time.
+
+    The CSV file is parsed by pyarrow's streaming reader, which parses each block using
+    multiple threads, and each block is appended to the Parquet file as soon as it has
+    been parsed.  Only a single block of the CSV file is held in memory at any time.
+
+    Args:
+        csv_path:  Path of the CSV file
+        parquet_path:  Path of the Parquet file to write
+        dtypes:  Dictionary whose keys are the names of the columns to parse and whose
+            values are the data types to use for those columns.  The signature
+            generated from it by _get_cache_signature is stored in the schema metadata
+            of the Parquet file.
+        block_size:  Approximate number of bytes of the CSV file to parse at a time
+    """
+    schema = _get_arrow_schema(dtypes)
+    signature = json.dumps(_get_cache_signature(dtypes)).encode()
+    schema = schema.with_metadata(
+        schema.metadata | {PARQUET_CACHE_SIGNATURE_KEY: signature}
+    )
+    # The raw data writes some integer counts with a decimal point, e.g., 3600.0, which
+    # pandas.read_csv accepts for an integer column but pyarrow's CSV reader does not.
+    # Integer columns are therefore parsed as floats and cast to integers below; the
+    # cast raises an error if a value has a fractional part.
+    column_types = {
+        field.name: pa.float64() if pa.types.is_integer(field.type) else field.type
+        for field in schema
+    }
+    reader = pa_csv.open_csv(
+        csv_path,
+        read_options=pa_csv.ReadOptions(block_size=block_size),
+        # Free-text columns (e.g., 'desc' and 'emp_title') contain quoted values with
+        # embedded newlines, which the reader must not treat as the end of a row in
+        # splitting the file into blocks.
+        parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+        convert_options=pa_csv.ConvertOptions(
+            column_types=column_types,
+            include_columns=schema.names,
+            # As in pandas.read_csv, treat empty strings (and other markers such as
+            # 'NA') as missing values in string columns.
+            strings_can_be_null=True,
+        ),
+    )
+    # Write to a temporary file so that an interrupted conversion does not leave behind
+    # a partial file that would be mistaken for a valid cache.
+    tmp_path = parquet_path.with_suffix(".tmp")
+    try:
+        with pq.ParquetWriter(tmp_path, schema, compression="zstd") as writer:
+            for batch in reader:
+                writer.write_table(pa.Table.from_batches([batch]).cast(schema))
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    tmp_path.replace(parquet_path)
+
+
+def _get_arrow_schema(dtypes):
+    """Generate the pyarrow schema corresponding to a dictionary of pandas data types.
+
+    The schema includes the pandas metadata that restores the data types when the
+    Parquet file is read with pandas.read_parquet.
+
+    Args:
+        dtypes:  Dictionary whose keys are column names and whose values are pandas
+            data types
+
+    Returns:
+        pyarrow.Schema with one field per column
+    """
+    empty_data = pd.DataFrame(
+        {col_name: pd.Series(dtype=dtype) for col_name, dtype in dtypes.items()}
+    )
+    schema = pa.Schema.from_pandas(empty_data, preserve_index=False)
+    for index, field in enumerate(schema):
+        # The value type of a dictionary (categorical) column cannot be inferred from an
+        # empty column.  The categorical columns in the raw data hold strings.
+        if pa.types.is_dictionary(field.type):
+            schema = schema.set(
+                index, field.with_type(pa.dictionary(pa.int32(), pa.string()))
+            )
+        # pyarrow's CSV reader produces string rather than large_string columns.
+        elif pa.types.is_large_string(field.type):
+            schema = schema.set(index, field.with_type(pa.string()))
+    return schema
 
 
 def filter_acc_loan_data(data):
@@ -134,17 +369,57 @@ def filter_acc_loan_data(data):
     Returns:
         Dataframe with unwanted rows filtered out
     """
-    bool_index = (
-        data["loan_status"].notna()
-        & (~data["loan_status"].str.startswith("Does not meet"))
-        & (data["issue_d"] >= "2012-01")
-    )
-    int_rate_is_anomalous = (data["grade"] != "A") & (data["int_rate"] < 7)
-    int_rate_is_anomalous = int_rate_is_anomalous | (
-        (data["grade"] == "D") & (data["int_rate"] < 9)
+    # Each condition is converted to a plain NumPy boolean array, so that the
+    # conditions can be combined in place without the overhead of nullable booleans.
+    # Missing values exclude a row, as they do when a nullable boolean is used as an
+    # index:  a missing interest rate counts as anomalous (unless the grade is A), a
+    # missing grade counts as anomalous unless the interest rate is at least 9, and a
+    # missing issue date fails the date condition.
+    int_rate = data["int_rate"]
+    below_7 = (int_rate < 7).to_numpy(dtype=bool, na_value=True)
+    below_9 = (int_rate < 9).to_numpy(dtype=bool, na_value=True)
+    # The column 'grade' is normally loaded as a categorical, in which case astype is a
+    # no-op and the grades are compared using the integer category codes.
+    grade = data["grade"].astype("category")
+    int_rate_is_anomalous = ~_get_category_mask(grade, "A") & below_7
+    int_rate_is_anomalous |= _get_category_mask(grade, "D") & below_9
+    int_rate_is_anomalous |= grade.isna().to_numpy() & below_9
+
+    bool_index = np.logical_and.reduce(
+        [
+            data["loan_status"].notna().to_numpy(),
+            ~data["loan_status"]
+            .str.startswith("Does not meet", na=False)
+            .to_numpy(dtype=bool),
+            (data["issue_d"] >= "2012-01").to_numpy(dtype=bool, na_value=False),
+            ~int_rate_is_anomalous,
+        ]
     )
-    bool_index = bool_index & (~int_rate_is_anomalous)
-    return data[bool_index]
+    # The filtered rows are already a copy of the input; the shallow copy only marks the
+    # result as independent of the input, so that its columns can be replaced.
+    data = data[bool_index].copy(deep=False)
+    # Drop the categories (e.g., of 'loan_status') that no longer occur in the filtered
+    # data, so that they do not show up with zero counts in tables and plots.
+    for col_name in data.select_dtypes("category").columns:
+        data[col_name] = data[col_name].cat.remove_unused_categories()
+    return data
+
+
+def _get_category_mask(ser, category):
+    """Compare a categorical series with a single category using the category codes.
+
+    Args:
+        ser:  Series with a categorical data type
+        category:  The category to compare with
+
+    Returns:
+        NumPy boolean array that is True where the series equals the category.  Missing
+        values compare as False.
+    """
+    categories = ser.cat.categories
+    if category not in categories:
+        return np.zeros(len(ser), dtype=bool)
+    return ser.cat.codes.to_numpy() == categories.get_loc(category)
 
 
 def convert_acc_loan_data(data, conversions=ACC_LOANS_CONVERSIONS):
@@ -157,31 +432,81 @@ def convert_acc_loan_data(data, conversions=ACC_LOANS_CONVERSIONS):
     Returns:
         Dataframe with converted columns containing the table of accepted loans
 
-    Note that this function mutates the input argument 'data'.
+    The converted columns replace the original ones in a shallow copy of the input, so
+    the input argument 'data' is not modified and the unconverted columns are not
+    copied.  Columns that have already been converted are skipped, so the function can
+    safely be applied more than once.
     """
-    if "time_intervals" in conversions:
-        data["term"] = (
-            data["term"].str.replace("months", "").str.strip().astype("Int64")
+    converted_cols = {}
+    if "time_intervals" in conversions and not is_integer_dtype(data["term"]):
+        # Values in the raw data have the form ' 36 months'.
+        converted_cols["term"] = _extract_number(
+            data["term"], r"^\s*(\d+) months$", "Int64"
         )
     if "dates" in conversions:
         for col_name in ACC_LOANS_DATE_COLUMNS:
-            data[col_name] = (
-                data[col_name]
-                .map(_get_iso_date_string, na_action="ignore")
-                .astype("string")
-            )
+            if _has_iso_dates(data[col_name]):
+                continue
+            converted_cols[col_name] = _convert_dates_to_iso(data[col_name])
     if "booleans" in conversions:
-        mapper = {"N": False, "Y": True}
+        # Map both cases directly rather than upper-casing the whole column first.
+        mapper = {"N": False, "Y": True, "n": False, "y": True}
         for col_name in ACC_LOANS_BOOLEAN_COLUMNS:
-            data[col_name] = (
-                data[col_name]
-                .str.upper()
-                .map(mapper, na_action="ignore")
-                .astype("boolean")
+            if is_bool_dtype(data[col_name]):
+                continue
+            converted_cols[col_name] = (
+                data[col_name].map(mapper, na_action="ignore").astype("boolean")
             )
+    # DataFrame.assign would make a deep copy of the whole table (unless copy-on-write
+    # is enabled), so assign the converted columns to a shallow copy instead.
+    data = data.copy(deep=False)
+    for col_name, converted_col in converted_cols.items():
+        data[col_name] = converted_col
     return data
 
 
+def _convert_dates_to_iso(ser):
+    """Convert a column of year-month combinations to ISO format.
+
+    For example, 'Jun-2015' is converted to '2015-06'.  A date column holds only a few
+    hundred distinct values, so only the distinct values are parsed and formatted.  The
+    result is then built directly as a string array by indexing into the formatted
+    values, which avoids an intermediate column of Python objects.
+
+    Args:
+        ser:  Series of strings containing year-month combinations in the format used
+            in the raw data, e.g., Jun-2015
+
+    Returns:
+        Series of strings (dtype 'string') containing year-month combinations in ISO
+        format, e.g., 2015-06
+    """
+    codes, uniques = pd.factorize(ser)
+    iso_uniques = pd.to_datetime(uniques, format="%b-%Y").strftime("%Y-%m")
+    # Missing values have the code -1, which take converts to <NA>.
+    iso_dates = pd.array(iso_uniques, dtype="string").take(codes, allow_fill=True)
+    return pd.Series(iso_dates, index=ser.index, name=ser.name)
+
+
+def _has_iso_dates(ser):
+    """Check whether a column of dates has already been converted to ISO format.
+
+    A column is always converted as a whole, so only the first non-missing value is
+    inspected.
+
+    Args:
+        ser:  Series of dates expressed as strings
+
+    Returns:
+        Boolean indicating whether the dates are in ISO format, e.g., 2015-06.  True is
+        also returned if all values are missing, since there is nothing to convert.
+    """
+    not_missing = ser.notna().to_numpy()
+    if not not_missing.any():
+        return True
+    return ISO_DATE_PATTERN.fullmatch(ser.iloc[not_missing.argmax()]) is not None
+
+
 def convert_rej_loan_data(data, conversions=REJ_LOANS_CONVERSIONS):
     """Perform data conversion on selected columns in the table of rejected loans.
 
@@ -195,41 +520,34 @@ def convert_rej_loan_data(data, conversions=REJ_LOANS_CONVERSIONS):
     Note that this function mutates the input argument 'data'.
     """
     if "percentages" in conversions:
-        data["Debt-To-Income Ratio"] = (
-            data["Debt-To-Income Ratio"].str.replace("%", "").astype("Float64")
+        # Values in the raw data have the form '10.5%'; negative values also occur.
+        data["Debt-To-Income Ratio"] = _extract_number(
+            data["Debt-To-Income Ratio"], r"^(-?[\d.]+)%$", "Float64"
         )
     return data
 
 
-def _get_iso_date_string(element):
-    """Convert a date string representing a year-month combination to ISO format.
-
-    For example, 'Jun-2015' is converted to '2015-06'.
+def _extract_number(ser, pattern, dtype):
+    """Extract a number from each string in a column using a regular expression.
 
     Args:
-        element:  String containing a year-month combination in the format used in the
-            raw data, e.g., Jun-2015
+        ser:  Series of strings
+        pattern:  Regular expression, anchored at both ends, with a single capture group
+            that matches the number
+        dtype:  Data type of the returned series
 
     Returns:
-        String containing a year-month combination in ISO format, e.g., 2015-06
-    """
-    iso_month_labels = define_month_conversions()
-    month, year = element.lower().split("-")
-    return year + "-" + iso_month_labels[month]
-
-
-def define_month_conversions():
-    """Return a dictionary used in converting month names to ISO format labels."""
-    # The array of capitalized month names in chronological order provided by the
-    # calendar module has the empty string as the first element, which is discarded.
-    ordered_months = list(month_name)[1:]
+        Series containing the extracted numbers
 
-    # Dictionary used in converting abbreviated month names to month numbers in ISO
-    # format.
-    return {
-        month.lower()[:3]: format(index + 1, "02")
-        for index, month in enumerate(ordered_months)
-    }
+    Raises:
+        ValueError:  If a non-missing value does not match the pattern
+    """
+    extracted = ser.str.extract(pattern, expand=False)
+    malformed = extracted.isna() & ser.notna()
+    if malformed.any():
+        examples = ser[malformed].unique()[:5].tolist()
+        raise ValueError(f"Unexpected values in column {ser.name!r}: {examples}")
+    return extracted.astype(dtype)
 
 
 def get_loan_metadata(loan_data, feature_descriptions=None):
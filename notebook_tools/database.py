@@ -3,13 +3,28 @@
 The functions in this module understand the details of the database and provide
 an API that hides most of those details from other modules.
 """
-from pandas import read_sql_query
-from sqlalchemy import create_engine, text
+from functools import lru_cache
+
+from pandas import concat, read_sql_query
+from sqlalchemy import create_engine, event, text
 
 from notebook_tools import DATA_DIR
 
 DATABASE_PATH = DATA_DIR / "lending-club.sqlite"
-DATABASE_ENGINE = create_engine(url="sqlite:///" + str(DATABASE_PATH))
+
+# PRAGMA statements executed on each new connection to the database.  Memory-mapping
+# the database file lets SQLite read pages without copying them through its page
+# cache, and the larger page cache reduces repeated reads of the file.
+CONNECTION_PRAGMAS = (
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA cache_size = -65536",
+)
+
+# Number of rows to insert at a time in adding tables to the database
+TO_SQL_CHUNKSIZE = 10_000
+
+# Number of rows to read at a time in querying the table of accepted loans
+READ_SQL_CHUNKSIZE = 100_000
 
 SQL_STRINGS = {
     "loan_data": """
@@ -26,6 +41,31 @@ SQL_STRINGS = {
 }
 
 
+def _create_engine():
+    """Create an engine for the project database.
+
+    The engine keeps a pool of connections that are reused across queries, so the
+    PRAGMA statements in CONNECTION_PRAGMAS are executed only when the pool opens a new
+    connection.
+
+    Returns:
+        sqlalchemy.engine.Engine object for the project database
+    """
+    engine = create_engine(url="sqlite:///" + str(DATABASE_PATH))
+
+    @event.listens_for(engine, "connect")
+    def configure_connection(dbapi_con, _connection_record):
+        cursor = dbapi_con.cursor()
+        for pragma in CONNECTION_PRAGMAS:
+            cursor.execute(pragma)
+        cursor.close()
+
+    return engine
+
+
+DATABASE_ENGINE = _create_engine()
+
+
 def get_loan_data():
     """Query the database for the full table of accepted loans.
 
@@ -34,8 +74,20 @@ def get_loan_data():
     """
     metadata = get_loan_metadata()
     dtypes = metadata["data type"].to_dict()
-    loan_data = _perform_query(query=text(SQL_STRINGS["loan_data"]))
-    return loan_data.astype(dtypes)
+    # The data types are applied as each chunk of rows is read, so that the full table
+    # is never held in memory as generic Python objects.  Since the categories found in
+    # different chunks can differ, categorical columns are read as strings and only
+    # converted once the chunks have been combined.
+    categorical_dtypes = {
+        col_name: dtype for col_name, dtype in dtypes.items() if dtype == "category"
+    }
+    chunk_dtypes = dtypes | {col_name: "string" for col_name in categorical_dtypes}
+    loan_data = _perform_query(
+        query=text(SQL_STRINGS["loan_data"]),
+        chunksize=READ_SQL_CHUNKSIZE,
+        dtype=chunk_dtypes,
+    )
+    return loan_data.astype(categorical_dtypes)
 
 
 def get_loan_metadata():
@@ -46,24 +98,48 @@ def get_loan_metadata():
         for one column in the table of accepted loans.  The index is 'column name', and
         the two columns are 'description' and 'data type'.
     """
+    # Return a copy so that callers cannot modify the cached table.
+    return _query_loan_metadata().copy()
+
+
+@lru_cache(maxsize=1)
+def _query_loan_metadata():
+    """Query the database for metadata on the table of accepted loans.
+
+    The result is cached, since the metadata is needed by several functions in this
+    module.  The cache is cleared whenever the database is modified.
+
+    Returns:
+        Dataframe of metadata on the table of accepted loans, with index 'column name'
+    """
     metadata = _perform_query(query=text(SQL_STRINGS["loan_metadata"]))
     return metadata.set_index("column name")
 
 
-def _perform_query(query, params=None):
+def _perform_query(query, params=None, chunksize=None, dtype=None):
     """Query the database and return the result as a dataframe.
 
     Args:
         query:  sqlalchemy.sql.expression.TextClause object representing the SQL
             query
         params:  Dictionary of parameters to bind to the query
+        chunksize:  If not None, the number of rows of the result to read at a time.
+            The chunks are combined into a single dataframe.
+        dtype:  Data type or dictionary of data types passed to
+            pandas.read_sql_query and applied to the result (to each chunk, if
+            chunksize is not None)
 
     Returns:
         Dataframe corresponding to the query result
     """
     _raise_for_missing_engine()
     with DATABASE_ENGINE.connect() as con:
-        return read_sql_query(query, con, params=params)
+        result = read_sql_query(
+            query, con, params=params, chunksize=chunksize, dtype=dtype
+        )
+        if chunksize is not None:
+            result = concat(result, ignore_index=True)
+        return result
 
 
 def create_database(tables):
@@ -95,8 +171,9 @@ def _delete_database():
     DATABASE_ENGINE = None
     # Delete the database
     DATABASE_PATH.unlink()
+    _query_loan_metadata.cache_clear()
     # Create a new engine.
-    DATABASE_ENGINE = create_engine(url="sqlite:///" + str(DATABASE_PATH))
+    DATABASE_ENGINE = _create_engine()
 
 
 def add_tables(tables, **kwargs):
@@ -107,13 +184,21 @@ def add_tables(tables, **kwargs):
             pandas dataframes that are converted to SQLite tables
         kwargs:  Keyword arguments that are passed to pandas.DataFrame.to_sql.  Note
             that add_tables passes index=False to to_sql, so 'index' should not be used
-            as one of the keyword arguments.
+            as one of the keyword arguments.  Unless 'chunksize' is passed, rows are
+            inserted in chunks of TO_SQL_CHUNKSIZE rows.
     """
+    kwargs.setdefault("chunksize", TO_SQL_CHUNKSIZE)
     _raise_for_missing_engine()
     with DATABASE_ENGINE.connect() as con:
+        # Pass the underlying sqlite3 connection to pandas, which then inserts each
+        # chunk of rows using a single call to the driver's executemany.  This is
+        # several times faster than inserting through sqlalchemy, and the resulting
+        # tables hold the same values.
+        dbapi_con = con.connection.driver_connection
         for name, df in tables.items():
-            df.to_sql(name, con=con, index=False, **kwargs)
-        con.commit()
+            df.to_sql(name, con=dbapi_con, index=False, **kwargs)
+        dbapi_con.commit()
+    _query_loan_metadata.cache_clear()
 
 
 def _raise_for_missing_engine():
@@ -1,5 +1,4 @@
 """Functions used in generating derived features."""
-import numpy as np
 import pandas as pd
 
 
@@ -19,17 +18,16 @@ def calculate_duration(data, start, end):
         nullable integer (Int64)
     """
 
-    def to_period(ser):
-        return pd.to_datetime(ser, format="ISO8601").dt.to_period(freq="M")
+    def to_month_count(ser):
+        dates = pd.to_datetime(ser, format="ISO8601")
+        return 12 * dates.dt.year + dates.dt.month
 
     # We are not looking for the exact difference (in days) between dates; instead, we
     # want the number of months between two "dates" that represent month-long time
     # spans, e.g., the number of months between 2015-12 and 2016-06. Convert each date
-    # column to a pd.Period object and take the difference to get offsets corresponding
-    # to a number of months.
-    duration = to_period(data[end]) - to_period(data[start])
-    # To extract the integer number of months in the offset, use the 'n' attribute.
-    duration = duration.apply(lambda value: np.nan if pd.isna(value) else value.n)
+    # to a count of months (12 * year + month) so that the difference can be taken in a
+    # single vectorized operation.  Missing dates propagate as NaN.
+    duration = to_month_count(data[end]) - to_month_count(data[start])
     return duration.astype("Int64")
 
 
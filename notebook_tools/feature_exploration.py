@@ -1,4 +1,5 @@
 """Functions that facilitate feature exploration."""
+from pandas import CategoricalDtype
 
 
 def summarize_loan_data(data, include):
@@ -8,7 +9,8 @@ def summarize_loan_data(data, include):
         data:  Dataframe containing loan data (either accepted or rejected loans)
         include:  Determines which data types are included in the summary.  This
             argument is passed as the 'include' argument to pandas.describe.  Typical
-            values for the current project are np.number, 'string', and 'boolean'.
+            values for the current project are np.number, 'string', 'category', and
+            'boolean'.
 
     Returns:
         Dataframe summarizing the data
@@ -30,7 +32,8 @@ def summarize_acc_loans(data, include, feature_descriptions):
         data:  Dataframe containing data on accepted loans
         include:  Determines which data types are included in the summary.  This
             argument is passed as the 'include' argument to pandas.describe.  Typical
-            values for the current project are np.number, 'string', and 'boolean'.
+            values for the current project are np.number, 'string', 'category', and
+            'boolean'.
         feature_descriptions:  Dataframe with a column 'description' that gives a
             description of each feature in the data on accepted loans.  The index of
             this dataframe should match the column names of the 'data' argument.
@@ -72,8 +75,11 @@ def get_value_counts(ser):
         ser:  Series, e.g., a column extracted from a dataframe containing loan data
 
     Returns:
-        Dataframe giving value counts for the series.
+        Dataframe giving value counts for the series.  For a categorical series, only
+        the categories that occur in the series are counted.
     """
+    if isinstance(ser.dtype, CategoricalDtype):
+        ser = ser.cat.remove_unused_categories()
     return ser.value_counts(dropna=False).to_frame()
 
 